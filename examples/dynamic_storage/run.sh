@@ -0,0 +1,3 @@
+#!/bin/sh -e
+
+python main.py model examples/dynamic_storage/storage.yaml --log-file log_file_3.csv
\ No newline at end of file
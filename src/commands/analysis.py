@@ -4,23 +4,74 @@ import typing
 import csv
 
 import matplotlib.pyplot as plt
+import numpy as np
 
 
 class CommandArgument(typing.Protocol):
-    args: Path
+    args: typing.Optional[Path]
+    stats: typing.Optional[Path]
+    error: typing.Callable[[str], typing.NoReturn]
 
 
 def parse_arguments(arg_parser: argparse.ArgumentParser) -> None:
+    arg_parser.add_argument(
+        '--stats',
+        dest='stats',
+        metavar='PARAM.npz',
+        type=Path,
+        help='counters saved by model --stats-file',
+    )
     arg_parser.add_argument(
         dest='args',
         metavar='PARAM.csv',
         type=Path,
+        nargs='?',
     )
-    arg_parser.set_defaults(command=exec_command)
+    arg_parser.set_defaults(command=exec_command, error=arg_parser.error)
 
 
 def exec_command(args: CommandArgument) -> None:
-    with open(args.args, 'r') as csv_file:
+    if not args.args and not args.stats:
+        args.error('the csv log file or --stats is required')
+    if args.args:
+        plot_delivery_times(args.args)
+    if args.stats:
+        plot_congestion(args.stats)
+    plt.show()
+
+
+def plot_congestion(stats_file: Path) -> None:
+    stats = np.load(stats_file)
+    walls = stats['walls']
+
+    heatmaps = [
+        ('visits', 'Посещения клеток'),
+        ('blocked', 'Столкновения'),
+        ('holds', 'Ожидания'),
+        ('loaded', 'Проезды с посылкой'),
+        ('empty', 'Проезды без посылки'),
+    ]
+    _, axs = plt.subplots(2, 3, figsize=(14, 8))
+    for ax, (name, title) in zip(axs.flat, heatmaps):
+        image = ax.imshow(np.ma.masked_array(stats[name], walls), origin='lower', cmap='hot')
+        ax.set_title(title)
+        plt.colorbar(image, ax=ax)
+
+    ax = axs.flat[-1]
+    robots = np.arange(len(stats['robot_idle']))
+    ax.bar(robots, stats['robot_loaded'], label='с посылкой')
+    ax.bar(robots, stats['robot_empty'], bottom=stats['robot_loaded'], label='без посылки')
+    ax.bar(robots, stats['robot_idle'], bottom=stats['robot_loaded'] + stats['robot_empty'], label='простой')
+    ax.set_title(f'Загрузка роботов за {int(stats["ticks"])} тактов')
+    ax.set_xlabel('робот')
+    ax.set_ylabel('такты')
+    ax.legend()
+
+    plt.tight_layout()
+
+
+def plot_delivery_times(log_file: Path) -> None:
+    with open(log_file, 'r') as csv_file:
         csv_reader = csv.reader(csv_file)
         next(csv_reader)
 
@@ -54,4 +105,3 @@ def exec_command(args: CommandArgument) -> None:
             axs[i].set_ylabel('Количество посылок')
 
         plt.tight_layout()
-        plt.show()
@@ -5,13 +5,21 @@ import typing
 import yaml
 
 from src.model.tile import create_tiles_map, Point
-from src.model.storage import StorageSystem, Robot, PackageConveyor, PackageStorage
-from src.model.control import AntControllerStorageSys
+from src.model.storage import StorageSystem, Robot, PackageConveyor, PackageStorage, LayoutEvent, LayoutAction
+from src.model.control import AntControllerStorageSys, ShortestPathControllerStorageSys
+from src.model.statistics import CongestionStats
+
+
+CONTROLLERS = ('ant', 'shortest-path')
 
 
 class CommandArgument(typing.Protocol):
     args: Path
     log_file: Path
+    controller: str
+    path_cache_size: int
+    stats_file: typing.Optional[Path]
+    stats_every: typing.Optional[int]
 
 
 def parse_arguments(arg_parser: argparse.ArgumentParser) -> None:
@@ -21,6 +29,34 @@ def parse_arguments(arg_parser: argparse.ArgumentParser) -> None:
         metavar='PARAM.csv',
         type=Path,
     )
+    arg_parser.add_argument(
+        '--controller',
+        dest='controller',
+        choices=CONTROLLERS,
+        default='ant',
+    )
+    arg_parser.add_argument(
+        '--path-cache-size',
+        dest='path_cache_size',
+        metavar='SIZE',
+        type=int,
+        default=10000,
+        help='maximum number of cached paths of the shortest-path controller',
+    )
+    arg_parser.add_argument(
+        '--stats-file',
+        dest='stats_file',
+        metavar='PARAM.npz',
+        type=Path,
+        help='file for per-cell congestion and per-robot utilisation counters',
+    )
+    arg_parser.add_argument(
+        '--stats-every',
+        dest='stats_every',
+        metavar='TICKS',
+        type=int,
+        help='also save the counters every TICKS ticks',
+    )
     arg_parser.add_argument(
         dest='args',
         metavar='PARAM.yaml',
@@ -48,6 +84,7 @@ def exec_command(args: CommandArgument) -> None:
                 conveyors['types'],
                 conveyors.get('expectation', []),
                 Point(out_point[0], out_point[1]) if out_point else None,
+                conveyors.get('enabled', True),
             )
         )
 
@@ -58,6 +95,18 @@ def exec_command(args: CommandArgument) -> None:
                 ind,
                 Point.from_tuple(storages['locations']),
                 storages['types'],
+                storages.get('enabled', True),
+            )
+        )
+
+    layout_events: typing.List[LayoutEvent] = list()
+    for event in data.get('layout_events', []):
+        layout_events.append(
+            LayoutEvent(
+                event['time'],
+                LayoutAction(event['action']),
+                tuple(tuple(point) for point in event.get('points', [])),
+                event.get('index', None),
             )
         )
 
@@ -66,12 +115,27 @@ def exec_command(args: CommandArgument) -> None:
         package_conveyors,
         package_storages,
         robots,
+        layout_events,
     )
+    stats: typing.Optional[CongestionStats] = None
+    if args.stats_file:
+        stats = CongestionStats(map_storage, len(robots), args.stats_file, args.stats_every)
+
     with open(args.log_file, 'w') as log_file:
-        ant_ctrl_sys = AntControllerStorageSys(
-            storage_system,
-            data['max_package'],
-            log_file,
-        )
-        ant_ctrl_sys.run()
+        if args.controller == 'shortest-path':
+            ctrl_sys = ShortestPathControllerStorageSys(
+                storage_system,
+                data['max_package'],
+                log_file,
+                args.path_cache_size,
+                stats,
+            )
+        else:
+            ctrl_sys = AntControllerStorageSys(
+                storage_system,
+                data['max_package'],
+                log_file,
+                stats,
+            )
+        ctrl_sys.run()
     print(map_storage)
@@ -1,11 +1,17 @@
 import abc
+import collections
 import dataclasses
 import typing
 import random
 import csv
 
-from .tile import TilesMap, Point, Direction, TypeTile
-from .storage import StorageSystem, Robot, PackageConveyor, PackageStorage
+from .tile import TilesMap, Point, Direction, TypeTile, SIMPLE_POINT
+from .storage import StorageSystem, Robot, PackageConveyor, PackageStorage, LayoutAction, LayoutEvent
+from .statistics import CongestionStats
+
+
+LOG_FIELDNAMES = ['time', 'id_action', 'id_robot', 'point', 'point_target', 'desc']
+MOVE_DIRECTIONS = (Direction.UP.value, Direction.DOWN.value, Direction.LEFT.value, Direction.RIGHT.value)
 
 
 class ControllerStorageSys(abc.ABC):
@@ -38,17 +44,42 @@ class _pheromon_tile:
             self.holding_pher *= coef
 
     def add_pheramon(self, direction: Point, correction_pher: float) -> None:
-        if direction == Direction.UP.value:
+        # Directions blocked after the robot passed them have no pheromone.
+        if direction == Direction.UP.value and self.up_pher is not None:
             self.up_pher += correction_pher
-        if direction == Direction.DOWN.value:
+        if direction == Direction.DOWN.value and self.down_pher is not None:
             self.down_pher += correction_pher
-        if direction == Direction.LEFT.value:
+        if direction == Direction.LEFT.value and self.left_pher is not None:
             self.left_pher += correction_pher
-        if direction == Direction.RIGHT.value:
+        if direction == Direction.RIGHT.value and self.right_pher is not None:
             self.right_pher += correction_pher
-        if direction == Direction.HOLDING.value:
+        if direction == Direction.HOLDING.value and self.holding_pher is not None:
             self.holding_pher += correction_pher
 
+    def update_walkability(self, map_storage: TilesMap) -> None:
+        """Removes the pheromone of blocked directions and puts the initial one on opened directions."""
+        if not map_storage.is_check_block_move(self.point):
+            self.up_pher = self.down_pher = self.left_pher = self.right_pher = self.holding_pher = None
+            return
+        if not map_storage.is_check_block_move(self.point + Direction.UP.value):
+            self.up_pher = None
+        elif self.up_pher is None:
+            self.up_pher = 1
+        if not map_storage.is_check_block_move(self.point + Direction.DOWN.value):
+            self.down_pher = None
+        elif self.down_pher is None:
+            self.down_pher = 1
+        if not map_storage.is_check_block_move(self.point + Direction.LEFT.value):
+            self.left_pher = None
+        elif self.left_pher is None:
+            self.left_pher = 1
+        if not map_storage.is_check_block_move(self.point + Direction.RIGHT.value):
+            self.right_pher = None
+        elif self.right_pher is None:
+            self.right_pher = 1
+        if self.holding_pher is None:
+            self.holding_pher = 1
+
     def return_direction_move(self, ignore_dir=[]) -> Point:
         dir: typing.List[Point] = []
         expectation: typing.List[float] = []
@@ -83,23 +114,20 @@ class _Pheromon_map:
     def return_tile(self, point: Point) -> _pheromon_tile:
         return self.tiles_map[point.y][point.x]
 
+    def update_points(self, map_storage: TilesMap, points: typing.Iterable[SIMPLE_POINT]) -> None:
+        """Updates only the tiles of the changed cells and of their neighbours."""
+        for x, y in points:
+            for direction in MOVE_DIRECTIONS + (Direction.HOLDING.value,):
+                point = Point(x, y) + direction
+                if 0 <= point.x < self.size[0] and 0 <= point.y < self.size[1]:
+                    self.return_tile(point).update_walkability(map_storage)
+
 
 def create_pheromon_map(map_storage: TilesMap) -> _Pheromon_map:
     pher_map = [[_pheromon_tile(Point(j, i)) for j in range(map_storage.size[0])] for i in range(map_storage.size[1])]
-    for x in range(map_storage.size[0]):
-        for y in range(map_storage.size[1]):
-            point = Point(x, y)
-            if not map_storage.is_check_block_move(point + Direction.HOLDING.value):
-                continue
-            if map_storage.is_check_block_move(point + Direction.UP.value):
-                pher_map[y][x].up_pher = 1
-            if map_storage.is_check_block_move(point + Direction.DOWN.value):
-                pher_map[y][x].down_pher = 1
-            if map_storage.is_check_block_move(point + Direction.LEFT.value):
-                pher_map[y][x].left_pher = 1
-            if map_storage.is_check_block_move(point + Direction.RIGHT.value):
-                pher_map[y][x].right_pher = 1
-            pher_map[y][x].holding_pher = 1
+    for lane_tiles in pher_map:
+        for tile in lane_tiles:
+            tile.update_walkability(map_storage)
     return _Pheromon_map(map_storage.size, pher_map)
 
 
@@ -109,16 +137,20 @@ class AntControllerStorageSys(ControllerStorageSys):
         storage_system: StorageSystem,
         max_package: int,
         log_file: typing.TextIO,
+        stats: typing.Optional[CongestionStats] = None,
     ) -> None:
         self.storage_system = storage_system
         self.max_package = max_package
         self.log_file = log_file
+        self.stats = stats
 
     def __post_init__(self) -> None:
         pass
 
     def check_taking_pack(self, robot: Robot) -> typing.Optional[PackageConveyor]:
         for conveyor in self.storage_system.package_conveyors:
+            if not conveyor.enabled:
+                continue
             if conveyor.out_point:
                 if conveyor.out_point == robot.location_point:
                     return conveyor
@@ -136,7 +168,7 @@ class AntControllerStorageSys(ControllerStorageSys):
 
     def check_giving_pack(self, robot: Robot) -> typing.Optional[PackageStorage]:
         for storage in self.storage_system.package_storages:
-            if robot.package_mail.type_mail not in storage.types_mail:
+            if not storage.enabled or robot.package_mail.type_mail not in storage.types_mail:
                 continue
             if robot.location_point == storage.location_point + Direction.UP.value:
                 return storage
@@ -164,8 +196,7 @@ class AntControllerStorageSys(ControllerStorageSys):
                 tile.add_pheramon(direction, 1 / len(travel))
                 pher_map.tiles_map[loc_point.y][loc_point.x] = tile
 
-        fieldnames = ['time', 'id_action', 'id_robot', 'point', 'point_target', 'desc']
-        writer = csv.DictWriter(self.log_file, fieldnames=fieldnames)
+        writer = csv.DictWriter(self.log_file, fieldnames=LOG_FIELDNAMES)
         writer.writeheader()
 
         time = 0
@@ -180,6 +211,11 @@ class AntControllerStorageSys(ControllerStorageSys):
             rob_travel[robot.id] = []
 
         while count_package <= self.max_package:
+            for event in self.storage_system.apply_layout_events(time):
+                if event.points:
+                    for pher_map in pher_map_mail.values():
+                        pher_map.update_points(self.storage_system.map_storage, event.points)
+                    pher_map_mail_all.update_points(self.storage_system.map_storage, event.points)
             for robot in self.storage_system.robots:
                 log_command: dict = {
                     'time': time, 'id_action': 0, 'id_robot': 0, 'point': (0, 0), 'point_target': (0, 0), 'desc': '-',
@@ -210,6 +246,8 @@ class AntControllerStorageSys(ControllerStorageSys):
                         pher_map_mail[mail.type_mail].del_pheromon()
                         travel_descent(travel, robot.location_point, pher_map)
                         rob_travel[robot.id] = []
+                        if self.stats:
+                            self.stats.record_idle(robot)
                         continue
                 else:
                     if conveyor := self.check_taking_pack(robot):
@@ -225,6 +263,8 @@ class AntControllerStorageSys(ControllerStorageSys):
                         log_command['desc'] = \
                             f'take mail type {robot.package_mail.type_mail} with index {robot.package_mail.id}'
                         writer.writerow(log_command)
+                        if self.stats:
+                            self.stats.record_idle(robot)
                         continue
 
                 ignore_dir = []
@@ -244,12 +284,304 @@ class AntControllerStorageSys(ControllerStorageSys):
                         else:
                             log_command['desc'] = 'move without mail'
                         writer.writerow(log_command)
+                        if self.stats:
+                            self.stats.record_move(robot, robot.location_point, move_direction)
                         self.storage_system.map_storage.reset_type_tile(robot.location_point)
                         robot.location_point += move_direction
                         self.storage_system.map_storage.set_type_tile(robot.location_point, TypeTile.robot)
                         ignore_dir = []
                         break
                     else:
+                        if self.stats:
+                            self.stats.record_blocked(robot.location_point + move_direction)
                         ignore_dir.append(move_direction)
                 rob_travel[robot.id].append(move_direction)
             time += 1
+            if self.stats:
+                self.stats.end_tick()
+        if self.stats:
+            self.stats.save()
+
+
+_PATH_KEY = typing.Tuple[SIMPLE_POINT, typing.Optional[str]]
+
+
+class _PathCache:
+    """LRU cache of shortest paths.
+
+    Paths are stored as next steps keyed by (source cell, target), where the target is
+    the type of mail for storages or None for conveyors. Every cell of a found path is
+    memoised, so a robot following a path hits the cache on each of its next moves.
+    An entry is kept only while the entry of its next step is cached, so removing an entry
+    also removes all the entries whose paths pass through it.
+    """
+    def __init__(self, max_size: int) -> None:
+        assert max_size > 0, 'The path cache size must be positive.'
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._next_steps: typing.OrderedDict[_PATH_KEY, SIMPLE_POINT] = collections.OrderedDict()
+        # (next step, target) -> keys of the entries that step onto it.
+        self._upstream_keys: typing.Dict[_PATH_KEY, typing.Set[_PATH_KEY]] = {}
+        self._keys_by_target: typing.Dict[typing.Optional[str], typing.Set[_PATH_KEY]] = {}
+
+    def _remove(self, key: _PATH_KEY) -> None:
+        """Removes the entry and the entries upstream of it."""
+        keys = [key]
+        while keys:
+            key = keys.pop()
+            keys.extend(self._upstream_keys.pop(key, ()))
+            step = self._next_steps.pop(key, None)
+            if step is None:
+                continue
+            upstream_keys = self._upstream_keys.get((step, key[1]))
+            if upstream_keys is not None:
+                upstream_keys.discard(key)
+            self._keys_by_target[key[1]].discard(key)
+
+    def __len__(self) -> int:
+        return len(self._next_steps)
+
+    def get(self, source: SIMPLE_POINT, target: typing.Optional[str]) -> typing.Optional[SIMPLE_POINT]:
+        key = (source, target)
+        step = self._next_steps.get(key)
+        if step is None:
+            self.misses += 1
+            return None
+        self._next_steps.move_to_end(key)
+        self.hits += 1
+        return step
+
+    def put_path(self, path: typing.Sequence[SIMPLE_POINT], target: typing.Optional[str]) -> None:
+        # The path is inserted from the end, so its source is the last to be evicted.
+        # A cell that is already cached keeps its entry: it is a shortest path of the same length.
+        for ind in range(len(path) - 2, -1, -1):
+            key = (path[ind], target)
+            if key in self._next_steps:
+                continue
+            self._next_steps[key] = path[ind + 1]
+            self._upstream_keys.setdefault((path[ind + 1], target), set()).add(key)
+            self._keys_by_target.setdefault(target, set()).add(key)
+        while len(self._next_steps) > self.max_size:
+            self._remove(next(iter(self._next_steps)))
+
+    def invalidate_point(self, point: SIMPLE_POINT) -> None:
+        """Removes the paths that start at point or pass through it."""
+        for target in list(self._keys_by_target):
+            self._remove((point, target))
+
+    def invalidate_target(self, target: typing.Optional[str]) -> None:
+        for key in list(self._keys_by_target.get(target, ())):
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._next_steps.clear()
+        self._upstream_keys.clear()
+        self._keys_by_target.clear()
+
+
+class ShortestPathControllerStorageSys(ControllerStorageSys):
+    """Baseline controller: robots go along the shortest paths to conveyors and storages.
+
+    Keyword arguments:
+    * storage_system -- the simulated storage.
+    * max_package -- number of delivered packages after which the run stops.
+    * log_file -- csv event log, same format as for AntControllerStorageSys.
+    * path_cache_size -- maximum number of (source cell, target) entries in the path cache.
+    * stats -- optional congestion counters.
+    """
+    def __init__(
+        self,
+        storage_system: StorageSystem,
+        max_package: int,
+        log_file: typing.TextIO,
+        path_cache_size: int = 10000,
+        stats: typing.Optional[CongestionStats] = None,
+    ) -> None:
+        self.storage_system = storage_system
+        self.max_package = max_package
+        self.log_file = log_file
+        self.stats = stats
+        self.path_cache = _PathCache(path_cache_size)
+        self._target_points: typing.Dict[typing.Optional[str], typing.Set[SIMPLE_POINT]] = {}
+
+    @staticmethod
+    def _dock_points(location_point: Point) -> typing.Set[SIMPLE_POINT]:
+        return {(location_point.x + direction.x, location_point.y + direction.y) for direction in MOVE_DIRECTIONS}
+
+    def _conveyor_points(self, conveyor: PackageConveyor) -> typing.Set[SIMPLE_POINT]:
+        if conveyor.out_point:
+            return {(conveyor.out_point.x, conveyor.out_point.y)}
+        return self._dock_points(conveyor.location_point)
+
+    def return_target_points(self, target: typing.Optional[str]) -> typing.Set[SIMPLE_POINT]:
+        """Cells where a robot can take a package (target is None) or put a package of type target."""
+        if target not in self._target_points:
+            points: typing.Set[SIMPLE_POINT] = set()
+            if target is None:
+                for conveyor in self.storage_system.package_conveyors:
+                    if conveyor.enabled:
+                        points |= self._conveyor_points(conveyor)
+            else:
+                for storage in self.storage_system.package_storages:
+                    if storage.enabled and target in storage.types_mail:
+                        points |= self._dock_points(storage.location_point)
+            self._target_points[target] = points
+        return self._target_points[target]
+
+    def check_taking_pack(self, robot: Robot) -> typing.Optional[PackageConveyor]:
+        location = (robot.location_point.x, robot.location_point.y)
+        for conveyor in self.storage_system.package_conveyors:
+            if conveyor.enabled and location in self._conveyor_points(conveyor):
+                return conveyor
+        return None
+
+    def check_giving_pack(self, robot: Robot) -> typing.Optional[PackageStorage]:
+        location = (robot.location_point.x, robot.location_point.y)
+        for storage in self.storage_system.package_storages:
+            if not storage.enabled or robot.package_mail.type_mail not in storage.types_mail:
+                continue
+            if location in self._dock_points(storage.location_point):
+                return storage
+        return None
+
+    def update_layout(self, event: LayoutEvent) -> None:
+        """Invalidates only the cached paths and target cells affected by the layout event."""
+        if event.action == LayoutAction.block:
+            for point in event.points:
+                self.path_cache.invalidate_point(point)
+        elif event.action == LayoutAction.unblock:
+            # An opened cell can shorten paths to any target far from it, so all paths are replanned.
+            self.path_cache.clear()
+        elif event.action in (LayoutAction.enable_conveyor, LayoutAction.disable_conveyor):
+            self._target_points.pop(None, None)
+            self.path_cache.invalidate_target(None)
+        else:
+            for type_mail in self.storage_system.package_storages[event.index].types_mail:
+                self._target_points.pop(type_mail, None)
+                self.path_cache.invalidate_target(type_mail)
+
+    def find_path(
+        self,
+        source: SIMPLE_POINT,
+        target: typing.Optional[str],
+        avoid_robots: bool = False,
+    ) -> typing.Optional[typing.List[SIMPLE_POINT]]:
+        """Breadth-first search of the shortest path from source to the nearest target cell.
+
+        With avoid_robots the cells occupied by robots are also treated as blocked.
+        """
+        map_storage = self.storage_system.map_storage
+        is_free = map_storage.is_valid_move if avoid_robots else map_storage.is_check_block_move
+        goals = self.return_target_points(target)
+        parents: typing.Dict[SIMPLE_POINT, typing.Optional[SIMPLE_POINT]] = {source: None}
+        queue: typing.Deque[SIMPLE_POINT] = collections.deque([source])
+        while queue:
+            cell = queue.popleft()
+            if cell in goals:
+                path: typing.List[SIMPLE_POINT] = []
+                while cell is not None:
+                    path.append(cell)
+                    cell = parents[cell]
+                return path[::-1]
+            for direction in MOVE_DIRECTIONS:
+                neighbour = (cell[0] + direction.x, cell[1] + direction.y)
+                if neighbour in parents or not is_free(Point.from_tuple(neighbour)):
+                    continue
+                parents[neighbour] = cell
+                queue.append(neighbour)
+        return None
+
+    def return_direction_move(self, robot: Robot, target: typing.Optional[str]) -> Point:
+        map_storage = self.storage_system.map_storage
+        source = (robot.location_point.x, robot.location_point.y)
+        step = self.path_cache.get(source, target)
+        if step is None:
+            path = self.find_path(source, target)
+            if path and len(path) > 1:
+                self.path_cache.put_path(path, target)
+                step = path[1]
+        if step is not None and map_storage.is_valid_move(Point.from_tuple(step)):
+            return Point.from_tuple(step) - robot.location_point
+
+        # The next cell is occupied, a detour around the robots is taken for this step only.
+        # It is not cached, so the cache keeps only the shortest paths on the static map.
+        if step is not None and self.stats:
+            self.stats.record_blocked(Point.from_tuple(step))
+        path = self.find_path(source, target, avoid_robots=True)
+        if path and len(path) > 1:
+            return Point.from_tuple(path[1]) - robot.location_point
+
+        # There is no detour, a random step is taken to break deadlocks in narrow aisles.
+        dir: typing.List[Point] = [Direction.HOLDING.value]
+        for direction in MOVE_DIRECTIONS:
+            if map_storage.is_valid_move(robot.location_point + direction):
+                dir.append(direction)
+        return random.choice(dir)
+
+    def run(self) -> None:
+        writer = csv.DictWriter(self.log_file, fieldnames=LOG_FIELDNAMES)
+        writer.writeheader()
+
+        time = 0
+        count_package = 0
+
+        while count_package <= self.max_package:
+            for event in self.storage_system.apply_layout_events(time):
+                self.update_layout(event)
+            for robot in self.storage_system.robots:
+                log_command: dict = {
+                    'time': time, 'id_action': 0, 'id_robot': robot.id,
+                    'point': (robot.location_point.x, robot.location_point.y), 'point_target': (0, 0), 'desc': '-',
+                }
+
+                if robot.package_mail:
+                    if storage := self.check_giving_pack(robot):
+                        log_command['id_action'] = 0
+                        log_command['point_target'] = (storage.location_point.x, storage.location_point.y)
+                        log_command['desc'] = \
+                            f'put mail type {robot.package_mail.type_mail} with index {robot.package_mail.id}'
+                        writer.writerow(log_command)
+                        robot.package_mail = None
+
+                        if count_package % 100 == 0:
+                            print(count_package)
+                        count_package += 1
+                        if self.stats:
+                            self.stats.record_idle(robot)
+                        continue
+                else:
+                    if conveyor := self.check_taking_pack(robot):
+                        robot.package_mail = conveyor.return_package_mail()
+                        log_command['id_action'] = 1
+                        log_command['point_target'] = (conveyor.location_point.x, conveyor.location_point.y)
+                        log_command['desc'] = \
+                            f'take mail type {robot.package_mail.type_mail} with index {robot.package_mail.id}'
+                        writer.writerow(log_command)
+                        if self.stats:
+                            self.stats.record_idle(robot)
+                        continue
+
+                target = robot.package_mail.type_mail if robot.package_mail else None
+                move_direction = self.return_direction_move(robot, target)
+                end_point = robot.location_point + move_direction
+                log_command['id_action'] = 2
+                log_command['point_target'] = (end_point.x, end_point.y)
+                if robot.package_mail:
+                    log_command['desc'] = \
+                        f'move mail type {robot.package_mail.type_mail} with index {robot.package_mail.id}'
+                else:
+                    log_command['desc'] = 'move without mail'
+                writer.writerow(log_command)
+                if self.stats:
+                    self.stats.record_move(robot, robot.location_point, move_direction)
+                self.storage_system.map_storage.reset_type_tile(robot.location_point)
+                robot.location_point = end_point
+                self.storage_system.map_storage.set_type_tile(robot.location_point, TypeTile.robot)
+            time += 1
+            if self.stats:
+                self.stats.end_tick()
+        if self.stats:
+            self.stats.save()
+        print(f'path cache: {len(self.path_cache)} entries, '
+              f'{self.path_cache.hits} hits, {self.path_cache.misses} misses')
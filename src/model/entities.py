@@ -67,12 +67,14 @@ class PackageConveyor(BaseModelAgent):
         types_mail: typing.Collection[str],
         expectation: typing.Optional[typing.Collection[float]],
         out_point: typing.Optional[Point] = None,
+        enabled: bool = True,
     ) -> None:
         self.id_conveyor = id_conveyor
         self.location_point = location_point
         self.types_mail = types_mail
         self.expectation = expectation
         self.out_point = out_point
+        self.enabled = enabled
 
         self.__post_init__()
 
@@ -82,8 +84,7 @@ class PackageConveyor(BaseModelAgent):
                 PackageConveyor._types_mail.add(type_mail)
 
     def return_package_mail(self) -> MailPackage:
-        expectation = self.expectation or [1 / len(PackageConveyor._types_mail)
-                                           for _ in range(len(PackageConveyor._types_mail))]
+        expectation = self.expectation or [1 / len(self.types_mail) for _ in range(len(self.types_mail))]
         mail = MailPackage(PackageConveyor._global_id_mail, random.choices(self.types_mail, expectation)[0])
         PackageConveyor._global_id_mail += 1
         return mail
@@ -92,10 +93,17 @@ class PackageConveyor(BaseModelAgent):
 class PackageStorage(BaseModelAgent):
     _types_mail: typing.Set[str] = set()
 
-    def __init__(self, id: int, location_point: Point, types_mail: typing.Collection[str]) -> None:
+    def __init__(
+        self,
+        id: int,
+        location_point: Point,
+        types_mail: typing.Collection[str],
+        enabled: bool = True,
+    ) -> None:
         self.id = id
         self.location_point = location_point
         self.types_mail = types_mail
+        self.enabled = enabled
 
         self.__post_init__()
 
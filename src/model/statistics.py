@@ -0,0 +1,86 @@
+from pathlib import Path
+import typing
+
+import numpy as np
+
+from .tile import TilesMap, Point, Direction, TypeTile
+from .entities import Robot
+
+
+class CongestionStats:
+    """Online counters of the robots traffic.
+
+    Per-cell arrays are indexed as [y][x], like TilesMap.tiles_map:
+    * visits -- moves into the cell.
+    * blocked -- attempts to move into the cell while it was occupied.
+    * holds -- ticks a robot held in the cell.
+    * loaded, empty -- moves into the cell with and without a package.
+
+    Per-robot arrays are indexed by the robot id:
+    * robot_loaded, robot_empty -- ticks moving with and without a package.
+    * robot_idle -- ticks without a move: holding, taking or putting a package.
+    """
+    def __init__(
+        self,
+        map_storage: TilesMap,
+        count_robots: int,
+        stats_file: Path,
+        checkpoint_every: typing.Optional[int] = None,
+    ) -> None:
+        self.map_storage = map_storage
+        self.stats_file = stats_file
+        self.checkpoint_every = checkpoint_every
+        self.ticks = 0
+
+        shape = (map_storage.size[1], map_storage.size[0])
+        self.visits = np.zeros(shape, dtype=np.int64)
+        self.blocked = np.zeros(shape, dtype=np.int64)
+        self.holds = np.zeros(shape, dtype=np.int64)
+        self.loaded = np.zeros(shape, dtype=np.int64)
+        self.empty = np.zeros(shape, dtype=np.int64)
+        self.robot_loaded = np.zeros(count_robots, dtype=np.int64)
+        self.robot_empty = np.zeros(count_robots, dtype=np.int64)
+        self.robot_idle = np.zeros(count_robots, dtype=np.int64)
+
+    def record_move(self, robot: Robot, start_point: Point, direction: Point) -> None:
+        if direction == Direction.HOLDING.value:
+            self.holds[start_point.y, start_point.x] += 1
+            self.robot_idle[robot.id] += 1
+            return
+        end_point = start_point + direction
+        self.visits[end_point.y, end_point.x] += 1
+        if robot.package_mail:
+            self.loaded[end_point.y, end_point.x] += 1
+            self.robot_loaded[robot.id] += 1
+        else:
+            self.empty[end_point.y, end_point.x] += 1
+            self.robot_empty[robot.id] += 1
+
+    def record_blocked(self, point: Point) -> None:
+        if 0 <= point.x < self.map_storage.size[0] and 0 <= point.y < self.map_storage.size[1]:
+            self.blocked[point.y, point.x] += 1
+
+    def record_idle(self, robot: Robot) -> None:
+        self.robot_idle[robot.id] += 1
+
+    def end_tick(self) -> None:
+        self.ticks += 1
+        if self.checkpoint_every and self.ticks % self.checkpoint_every == 0:
+            self.save()
+
+    def save(self) -> None:
+        walls = np.array([[tile.type_tile == TypeTile.barricade for tile in line_tiles]
+                          for line_tiles in self.map_storage.tiles_map])
+        np.savez_compressed(
+            self.stats_file,
+            ticks=np.array(self.ticks),
+            walls=walls,
+            visits=self.visits,
+            blocked=self.blocked,
+            holds=self.holds,
+            loaded=self.loaded,
+            empty=self.empty,
+            robot_loaded=self.robot_loaded,
+            robot_empty=self.robot_empty,
+            robot_idle=self.robot_idle,
+        )
@@ -1,9 +1,35 @@
+import dataclasses
+from enum import Enum
+import heapq
 import typing
 
-from .tile import TilesMap, TypeTile
+from .tile import TilesMap, TypeTile, Point, SIMPLE_POINT
 from .entities import BaseModelAgent, PackageConveyor, PackageStorage, Robot
 
 
+class LayoutAction(Enum):
+    block = 'block'
+    unblock = 'unblock'
+    enable_conveyor = 'enable_conveyor'
+    disable_conveyor = 'disable_conveyor'
+    enable_storage = 'enable_storage'
+    disable_storage = 'disable_storage'
+
+
+@dataclasses.dataclass(frozen=True)
+class LayoutEvent:
+    """Keyword arguments:
+    * time -- tick at which the change is applied.
+    * action -- type of the change.
+    * points -- cells to block or unblock.
+    * index -- index of the conveyor or storage to enable or disable.
+    """
+    time: int
+    action: LayoutAction
+    points: typing.Tuple[SIMPLE_POINT, ...] = ()
+    index: typing.Optional[int] = None
+
+
 class StorageSystem(BaseModelAgent):
     def __init__(
         self,
@@ -11,11 +37,13 @@ class StorageSystem(BaseModelAgent):
         package_conveyors: typing.Collection[PackageConveyor],
         package_storages: typing.Collection[PackageStorage],
         robots: typing.Collection[Robot],
+        layout_events: typing.Collection[LayoutEvent] = (),
     ) -> None:
         self.map_storage = map_storage
         self.package_conveyors = package_conveyors
         self.package_storages = package_storages
         self.robots = robots
+        self.layout_events = layout_events
 
         self.__post_init__()
 
@@ -29,3 +57,85 @@ class StorageSystem(BaseModelAgent):
             self.map_storage.set_type_tile(storage.location_point, TypeTile.storage)
         for robot in self.robots:
             self.map_storage.set_type_tile(robot.location_point, TypeTile.robot)
+
+        self._event_queue: typing.List[typing.Tuple[int, int, LayoutEvent]] = []
+        self._count_events = 0
+        for event in self.layout_events:
+            self._push_layout_event(event)
+        # Cells to block as soon as the robots leave them, in the order they were scheduled.
+        self._pending_blocks: typing.Dict[SIMPLE_POINT, None] = {}
+
+    def _push_layout_event(self, event: LayoutEvent) -> None:
+        if event.action in (LayoutAction.block, LayoutAction.unblock):
+            for x, y in event.points:
+                assert 0 <= x < self.map_storage.size[0] and 0 <= y < self.map_storage.size[1], \
+                    f'The point ({x}, {y}) of the layout event is outside the map.'
+        elif event.action in (LayoutAction.enable_conveyor, LayoutAction.disable_conveyor):
+            assert event.index is not None and 0 <= event.index < len(self.package_conveyors), \
+                f'There is no conveyor with index {event.index}.'
+        else:
+            assert event.index is not None and 0 <= event.index < len(self.package_storages), \
+                f'There is no storage with index {event.index}.'
+        # The counter keeps events with the same time in the order they were added.
+        heapq.heappush(self._event_queue, (event.time, self._count_events, event))
+        self._count_events += 1
+
+    def _block_points(self, points: typing.Iterable[SIMPLE_POINT]) -> typing.List[SIMPLE_POINT]:
+        """Blocks the empty cells, the cells occupied by robots become pending. Returns the blocked cells."""
+        changed: typing.List[SIMPLE_POINT] = []
+        for simple_point in points:
+            point = Point.from_tuple(simple_point)
+            type_tile = self.map_storage.tiles_map[point.y][point.x].type_tile
+            if type_tile == TypeTile.empty:
+                self.map_storage.set_type_tile(point, TypeTile.barricade)
+                self._pending_blocks.pop(simple_point, None)
+                changed.append(simple_point)
+            elif type_tile == TypeTile.robot:
+                self._pending_blocks[simple_point] = None
+        return changed
+
+    def _unblock_points(self, points: typing.Iterable[SIMPLE_POINT]) -> typing.List[SIMPLE_POINT]:
+        """Unblocks the cells and cancels their pending blocks. Returns the unblocked cells."""
+        changed: typing.List[SIMPLE_POINT] = []
+        for simple_point in points:
+            self._pending_blocks.pop(simple_point, None)
+            point = Point.from_tuple(simple_point)
+            if self.map_storage.tiles_map[point.y][point.x].type_tile == TypeTile.barricade:
+                self.map_storage.reset_type_tile(point)
+                changed.append(simple_point)
+        return changed
+
+    def apply_layout_events(self, time: int) -> typing.List[LayoutEvent]:
+        """Applies the layout events scheduled up to time.
+
+        Returns the applied events, their points are narrowed to the cells that were actually changed.
+        A cell occupied by a robot is blocked on the first tick after the robot leaves it,
+        unless an unblock of the cell comes before that.
+        """
+        applied: typing.List[LayoutEvent] = []
+        if self._pending_blocks:
+            changed = self._block_points(list(self._pending_blocks))
+            if changed:
+                applied.append(LayoutEvent(time, LayoutAction.block, tuple(changed)))
+
+        while self._event_queue and self._event_queue[0][0] <= time:
+            _, _, event = heapq.heappop(self._event_queue)
+            if event.action in (LayoutAction.block, LayoutAction.unblock):
+                if event.action == LayoutAction.block:
+                    changed = self._block_points(event.points)
+                else:
+                    changed = self._unblock_points(event.points)
+                if changed:
+                    applied.append(dataclasses.replace(event, points=tuple(changed)))
+                continue
+
+            if event.action in (LayoutAction.enable_conveyor, LayoutAction.disable_conveyor):
+                entity = self.package_conveyors[event.index]
+                enabled = event.action == LayoutAction.enable_conveyor
+            else:
+                entity = self.package_storages[event.index]
+                enabled = event.action == LayoutAction.enable_storage
+            if entity.enabled != enabled:
+                entity.enabled = enabled
+                applied.append(event)
+        return applied